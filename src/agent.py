@@ -1,18 +1,87 @@
 """LangChain agent setup and execution."""
 
 import logging
+from pathlib import Path
 from typing import List, Dict, Any, Optional, AsyncIterator
-from langchain.agents import AgentExecutor, create_openai_tools_agent
+import httpx
+import openai
+from langchain.agents import AgentExecutor
+from langchain.agents.format_scratchpad.openai_tools import format_to_openai_tool_messages
+from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
+from langchain_community.tools.convert_to_openai import format_tool_to_openai_tool
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.tools import BaseTool
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.globals import set_llm_cache
+from langchain_core.runnables import (
+    ConfigurableField, Runnable, RunnableLambda, RunnablePassthrough
+)
 
 from src.config import settings
-from src.tools import get_available_tools
+from src.tools import get_available_tools, get_openai_tool_schemas
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a helpful assistant. Use tools when needed; "
+    "if a tool fails, briefly explain and suggest an alternative."
+)
+AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", settings.agent_system_prompt or DEFAULT_SYSTEM_PROMPT),
+    MessagesPlaceholder(variable_name="chat_history"),
+    ("human", "{input}"),
+    MessagesPlaceholder(variable_name="agent_scratchpad")
+])
+
+
+def configure_llm_cache() -> None:
+    """Install the global LangChain LLM cache selected in settings.
+    
+    Cache keys cover the full prompt and model parameters, so only
+    requests with identical history, input, temperature and max_tokens hit.
+    """
+    backend = settings.llm_cache_backend.lower()
+    
+    if backend == "none":
+        set_llm_cache(None)
+        return
+    
+    if backend == "memory":
+        from langchain_community.cache import InMemoryCache
+        set_llm_cache(InMemoryCache())
+    elif backend == "sqlite":
+        from langchain_community.cache import SQLiteCache
+        Path(settings.llm_cache_path).parent.mkdir(parents=True, exist_ok=True)
+        set_llm_cache(SQLiteCache(database_path=settings.llm_cache_path))
+    elif backend == "redis":
+        import redis
+        from langchain_community.cache import RedisCache
+        set_llm_cache(RedisCache(redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db
+        ), ttl=settings.memory_ttl))
+    else:
+        raise ValueError(f"Unknown LLM cache backend: {settings.llm_cache_backend}")
+    
+    logger.info(f"LLM cache enabled: {backend}")
+
+
+class ToolUsageCallbackHandler(BaseCallbackHandler):
+    """Records the names of tools started during one agent invocation."""
+    
+    run_inline = True
+    
+    def __init__(self):
+        """Initialize the handler with an empty tool list."""
+        self.tools_used: List[str] = []
+    
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, **kwargs: Any) -> None:
+        """Record the tool name when a tool starts."""
+        self.tools_used.append(serialized.get("name", "unknown"))
+
 
 class ChatAgent:
     """Manages the LangChain agent for conversational AI with tool calling."""
@@ -31,25 +100,89 @@ class ChatAgent:
             max_tokens: Maximum tokens. Defaults to config setting.
         """
         self.tools = tools or get_available_tools()
+        tool_schemas = (
+            [format_tool_to_openai_tool(tool) for tool in tools]
+            if tools else get_openai_tool_schemas()
+        )
         self.temperature = temperature or settings.openai_temperature
         self.max_tokens = max_tokens or settings.openai_max_tokens
         
-        # Initialize LLM
-        self.llm = ChatOpenAI(
-            model=settings.openai_model,
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            api_key=settings.openai_api_key
+        # Pooled HTTP clients so keep-alive connections to OpenAI are reused;
+        # with HTTP/2, concurrent calls are multiplexed over one connection
+        http_options = dict(
+            http2=settings.openai_http2,
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive_connections,
+                keepalive_expiry=settings.openai_keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                settings.openai_timeout,
+                connect=settings.openai_connect_timeout
+            )
+        )
+        self.http_client = httpx.Client(**http_options)
+        self.http_async_client = httpx.AsyncClient(**http_options)
+        self.openai_client = openai.OpenAI(
+            api_key=settings.openai_api_key,
+            http_client=self.http_client,
+            timeout=http_options["timeout"]
         )
+        self.openai_async_client = openai.AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            http_client=self.http_async_client,
+            timeout=http_options["timeout"]
+        )
+        
+        # Initialize LLM; the model tier, temperature and max_tokens can be
+        # overridden per invocation without rebuilding the agent
+        alternatives = {
+            key: self._create_llm(model)
+            for key, model in (
+                ("fast", settings.openai_model_fast),
+                ("smart", settings.openai_model_smart)
+            )
+            if model
+        }
+        self.models = set(alternatives)
+        self.llm = self._create_llm(settings.openai_model)
+        if alternatives:
+            self.llm = self.llm.configurable_alternatives(
+                ConfigurableField(id="llm_model"),
+                default_key="default",
+                **alternatives
+            )
         
         # Create agent prompt
         self.prompt = self._create_prompt()
         
-        # Create agent
-        self.agent = create_openai_tools_agent(
-            llm=self.llm,
-            tools=self.tools,
-            prompt=self.prompt
+        # Create agent; same pipeline as create_openai_tools_agent, but
+        # bound to tool schemas that are only generated once per process
+        llm_with_tools = self.llm.bind(tools=tool_schemas)
+        self._agent_runnable = (
+            RunnablePassthrough.assign(
+                agent_scratchpad=lambda x: format_to_openai_tool_messages(
+                    x["intermediate_steps"]
+                )
+            )
+            | self.prompt
+            | llm_with_tools
+            | OpenAIToolsAgentOutputParser()
+        )
+        
+        # First agent step without the executor, used to stream replies
+        # that need no tools straight from the LLM
+        self._first_step_runnable = (
+            RunnablePassthrough.assign(agent_scratchpad=lambda _: [])
+            | self.prompt
+            | llm_with_tools
+        )
+        
+        # AgentExecutor does not forward the run config to the agent, so
+        # per-request overrides travel in the agent input instead
+        self.agent = RunnableLambda(
+            self._configure_agent,
+            afunc=self._aconfigure_agent
         )
         
         # Create agent executor
@@ -60,35 +193,66 @@ class ChatAgent:
             max_iterations=settings.agent_max_iterations,
             max_execution_time=settings.agent_max_execution_time,
             handle_parsing_errors=True,
-            return_intermediate_steps=True
+            return_intermediate_steps=False
         )
         
         logger.info(f"Agent initialized with {len(self.tools)} tools")
     
-    def _create_prompt(self) -> ChatPromptTemplate:
-        """Create the agent prompt template.
+    def _create_llm(self, model: str) -> Runnable:
+        """Create a chat model sharing the pooled OpenAI client.
         
+        Args:
+            model: OpenAI model name
+            
         Returns:
-            ChatPromptTemplate instance
+            ChatOpenAI runnable with configurable temperature and max_tokens
+        """
+        return ChatOpenAI(
+            model=model,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            api_key=settings.openai_api_key,
+            client=self.openai_client.chat.completions,
+            async_client=self.openai_async_client.chat.completions
+        ).configurable_fields(
+            temperature=ConfigurableField(id="llm_temperature"),
+            max_tokens=ConfigurableField(id="llm_max_tokens")
+        )
+    
+    async def warmup(self) -> None:
+        """Open a pooled connection to OpenAI ahead of the first request.
+        
+        Uses the models endpoint, which costs no tokens and is not
+        served from the LLM cache.
         """
-        system_message = """You are a helpful AI assistant with access to various tools.
-You can help users with calculations, web searches, weather information, and general questions.
-When a user asks a question that requires tool usage, use the appropriate tool(s) to get the information.
-Always provide clear, helpful responses based on the tool results.
-If a tool fails, explain the error to the user and suggest alternatives."""
+        try:
+            await self.openai_async_client.models.list()
+            logger.info("OpenAI connection pool warmed up")
+        except Exception as e:
+            logger.warning(f"Agent warmup failed: {str(e)}")
+    
+    async def aclose(self) -> None:
+        """Close the pooled HTTP clients."""
+        self.http_client.close()
+        await self.http_async_client.aclose()
+    
+    def _create_prompt(self) -> ChatPromptTemplate:
+        """Get the agent prompt template.
         
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", system_message),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad")
-        ])
+        The system message comes first and is identical across requests,
+        so it stays within OpenAI's automatic prompt-cache prefix.
         
-        return prompt
+        Returns:
+            ChatPromptTemplate instance
+        """
+        return AGENT_PROMPT
     
     def format_chat_history(self, messages: List[Dict[str, Any]]) -> List:
         """Format chat history for LangChain.
         
+        Only the most recent settings.max_history_messages messages are
+        kept, bounding the prompt size on long conversations.
+        
         Args:
             messages: List of message dictionaries with 'role' and 'content'
             
@@ -105,80 +269,272 @@ If a tool fails, explain the error to the user and suggest alternatives."""
             elif role == "assistant":
                 formatted.append(AIMessage(content=content))
         
+        if settings.max_history_messages > 0:
+            formatted = formatted[-settings.max_history_messages:]
+        
         return formatted
     
-    def run(
+    def select_model(
         self,
         user_input: str,
-        chat_history: Optional[List[Dict[str, Any]]] = None
-    ) -> Dict[str, Any]:
-        """Execute the agent with user input.
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        model: Optional[str] = None
+    ) -> Optional[str]:
+        """Pick the model tier for a request.
+        
+        An explicit, configured tier wins. Otherwise short opening messages
+        go to the fast model and the rest to the smart model, when set.
         
         Args:
             user_input: User's message
             chat_history: Previous conversation messages
+            model: Optional requested tier ('fast' or 'smart')
             
         Returns:
-            Dictionary with 'output', 'tools_used', and 'intermediate_steps'
+            Tier key, or None for the default model
         """
-        try:
-            # Format chat history
-            history = self.format_chat_history(chat_history or [])
+        if model in self.models:
+            return model
+        if (
+            "fast" in self.models
+            and not chat_history
+            and len(user_input) < settings.model_routing_max_chars
+        ):
+            return "fast"
+        if "smart" in self.models:
+            return "smart"
+        return None
+    
+    def _build_overrides(
+        self,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the configurable values carrying per-request LLM overrides.
+        
+        Args:
+            temperature: Optional temperature override
+            max_tokens: Optional max_tokens override
+            model: Optional model tier key from select_model
+            
+        Returns:
+            Mapping of configurable field ids to values
+        """
+        configurable = {}
+        if temperature is not None:
+            configurable["llm_temperature"] = temperature
+        if max_tokens is not None:
+            configurable["llm_max_tokens"] = max_tokens
+        if model is not None:
+            configurable["llm_model"] = model
+        return configurable
+    
+    def _configure_agent(self, inputs: Dict[str, Any]) -> Runnable:
+        """Apply the overrides from the agent input to the agent runnable.
+        
+        Args:
+            inputs: Agent input, optionally carrying a 'configurable' mapping
             
-            # Prepare input
-            agent_input = {
-                "input": user_input,
-                "chat_history": history
-            }
+        Returns:
+            Agent runnable to invoke for this step
+        """
+        configurable = inputs.get("configurable")
+        if configurable:
+            return self._agent_runnable.with_config(configurable=configurable)
+        return self._agent_runnable
+    
+    async def _aconfigure_agent(self, inputs: Dict[str, Any]) -> Runnable:
+        """Async version of _configure_agent."""
+        return self._configure_agent(inputs)
+    
+    def _prepare_input(
+        self,
+        user_input: str,
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        configurable: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Build the agent executor input.
+        
+        Args:
+            user_input: User's message
+            chat_history: Previous conversation messages
+            configurable: Optional per-request LLM overrides
             
-            # Execute agent
-            result = self.agent_executor.invoke(agent_input)
+        Returns:
+            Input dictionary for the agent executor
+        """
+        return {
+            "input": user_input,
+            "chat_history": self.format_chat_history(chat_history or []),
+            "configurable": configurable or {}
+        }
+    
+    def _format_result(
+        self,
+        result: Dict[str, Any],
+        tool_usage: ToolUsageCallbackHandler
+    ) -> Dict[str, Any]:
+        """Convert an agent executor result into the run() return format.
+        
+        Args:
+            result: Raw agent executor output
+            tool_usage: Callback handler that recorded the tools invoked
             
-            # Extract tools used
-            tools_used = []
-            if "intermediate_steps" in result:
-                for step in result["intermediate_steps"]:
-                    if len(step) > 0:
-                        tool_name = step[0].tool if hasattr(step[0], 'tool') else "unknown"
-                        tools_used.append(tool_name)
+        Returns:
+            Dictionary with 'output' and 'tools_used'
+        """
+        return {
+            "output": result.get("output", ""),
+            "tools_used": tool_usage.tools_used
+        }
+    
+    def _format_error(self, e: Exception) -> Dict[str, Any]:
+        """Build the run() return value for a failed execution."""
+        logger.error(f"Agent execution error: {str(e)}", exc_info=True)
+        return {
+            "output": f"I encountered an error: {str(e)}. Please try again.",
+            "tools_used": [],
+            "error": True
+        }
+    
+    def run(
+        self,
+        user_input: str,
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Execute the agent with user input.
+        
+        Args:
+            user_input: User's message
+            chat_history: Previous conversation messages
+            temperature: Optional temperature override for this call
+            max_tokens: Optional max_tokens override for this call
+            model: Optional model tier ('fast' or 'smart')
             
-            return {
-                "output": result.get("output", ""),
-                "tools_used": tools_used,
-                "intermediate_steps": result.get("intermediate_steps", [])
-            }
+        Returns:
+            Dictionary with 'output' and 'tools_used'
+        """
+        tool_usage = ToolUsageCallbackHandler()
+        try:
+            result = self.agent_executor.invoke(
+                self._prepare_input(
+                    user_input,
+                    chat_history,
+                    self._build_overrides(
+                        temperature,
+                        max_tokens,
+                        self.select_model(user_input, chat_history, model)
+                    )
+                ),
+                config={"callbacks": [tool_usage]}
+            )
+            return self._format_result(result, tool_usage)
+        except Exception as e:
+            return self._format_error(e)
+    
+    async def arun(
+        self,
+        user_input: str,
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Async version of run that does not block the event loop.
+        
+        Args:
+            user_input: User's message
+            chat_history: Previous conversation messages
+            temperature: Optional temperature override for this call
+            max_tokens: Optional max_tokens override for this call
+            model: Optional model tier ('fast' or 'smart')
             
+        Returns:
+            Dictionary with 'output' and 'tools_used'
+        """
+        tool_usage = ToolUsageCallbackHandler()
+        try:
+            result = await self.agent_executor.ainvoke(
+                self._prepare_input(
+                    user_input,
+                    chat_history,
+                    self._build_overrides(
+                        temperature,
+                        max_tokens,
+                        self.select_model(user_input, chat_history, model)
+                    )
+                ),
+                config={"callbacks": [tool_usage]}
+            )
+            return self._format_result(result, tool_usage)
         except Exception as e:
-            logger.error(f"Agent execution error: {str(e)}", exc_info=True)
-            return {
-                "output": f"I encountered an error: {str(e)}. Please try again.",
-                "tools_used": [],
-                "intermediate_steps": []
-            }
+            return self._format_error(e)
     
     async def astream(
         self,
         user_input: str,
-        chat_history: Optional[List[Dict[str, Any]]] = None
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        model: Optional[str] = None
     ) -> AsyncIterator[str]:
         """Stream agent response.
         
+        With settings.agent_stream_fast_path, the first LLM call is streamed
+        token by token; the agent executor only takes over, from the start,
+        once the LLM asks for a tool. Any text streamed before the tool call
+        stays and the executor's answer follows it after a blank line.
+        
         Args:
             user_input: User's message
             chat_history: Previous conversation messages
+            temperature: Optional temperature override for this call
+            max_tokens: Optional max_tokens override for this call
+            model: Optional model tier ('fast' or 'smart')
             
         Yields:
             Chunks of the response as strings
         """
         try:
-            # Format chat history
-            history = self.format_chat_history(chat_history or [])
+            agent_input = self._prepare_input(
+                user_input,
+                chat_history,
+                self._build_overrides(
+                    temperature,
+                    max_tokens,
+                    self.select_model(user_input, chat_history, model)
+                )
+            )
             
-            # Prepare input
-            agent_input = {
-                "input": user_input,
-                "chat_history": history
-            }
+            if settings.agent_stream_fast_path:
+                streamed = False
+                runnable = self._first_step_runnable
+                if agent_input["configurable"]:
+                    runnable = runnable.with_config(configurable=agent_input["configurable"])
+                
+                stream = runnable.astream(agent_input)
+                try:
+                    async for chunk in stream:
+                        if chunk.additional_kwargs.get("tool_calls"):
+                            break
+                        if chunk.content:
+                            streamed = True
+                            yield chunk.content
+                    else:
+                        # The LLM answered directly without requesting tools
+                        return
+                finally:
+                    # Release the abandoned LLM stream instead of leaving it to GC
+                    await stream.aclose()
+                
+                # Text sent before the tool call cannot be taken back, so the
+                # executor's answer follows it as a new paragraph
+                if streamed:
+                    yield "\n\n"
             
             # Stream agent execution
             async for chunk in self.agent_executor.astream(agent_input):
@@ -198,20 +554,24 @@ If a tool fails, explain the error to the user and suggest alternatives."""
 agent: Optional[ChatAgent] = None
 
 
-def get_agent(
-    temperature: Optional[float] = None,
-    max_tokens: Optional[int] = None
-) -> ChatAgent:
+def get_agent() -> ChatAgent:
     """Get or create the global agent instance.
     
-    Args:
-        temperature: Optional temperature override
-        max_tokens: Optional max_tokens override
-        
+    Per-request temperature and max_tokens overrides are passed to
+    ChatAgent.run/astream instead, so the agent is only built once.
+    
     Returns:
         ChatAgent instance
     """
     global agent
     if agent is None:
-        agent = ChatAgent(temperature=temperature, max_tokens=max_tokens)
+        agent = ChatAgent()
     return agent
+
+
+async def close_agent() -> None:
+    """Close the global agent's pooled resources, if it was created."""
+    global agent
+    if agent is not None:
+        await agent.aclose()
+        agent = None
@@ -0,0 +1,196 @@
+"""Response caches for tool results and near-duplicate chat queries."""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries optionally expire.
+    
+    Used to memoize tool results; sync tools run in worker threads, so
+    access is guarded by a lock.
+    """
+    
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        """Initialize the cache.
+        
+        Args:
+            max_entries: Maximum number of entries before the least recently
+                used one is evicted
+            ttl: Entry lifetime in seconds, or None to keep entries until evicted
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Any) -> Optional[Any]:
+        """Return the cached value for a key, or None if missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: Any, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+
+class SemanticCache:
+    """Caches agent responses keyed by the embedding of the user message.
+    
+    A lookup returns the stored response whose query embedding has the
+    highest cosine similarity to the new query, if it reaches the threshold
+    and has not expired. Entries are kept in a fixed-size ring buffer, so the
+    oldest entry is evicted once the cache is full.
+    """
+    
+    def __init__(
+        self,
+        embeddings: Optional[Any] = None,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[int] = None,
+        tool_ttls: Optional[Dict[str, int]] = None
+    ):
+        """Initialize the cache.
+        
+        Args:
+            embeddings: LangChain embeddings instance. Defaults to OpenAI
+                embeddings, created on first use.
+            threshold: Minimum cosine similarity for a hit. Defaults to config setting.
+            max_entries: Maximum number of cached responses. Defaults to config setting.
+            ttl: Entry lifetime in seconds. Defaults to config setting.
+            tool_ttls: Shorter lifetimes for responses that used the given
+                tools. Defaults to config setting.
+        """
+        self._embeddings = embeddings
+        self.threshold = threshold if threshold is not None else settings.semantic_cache_threshold
+        self.max_entries = max_entries or settings.semantic_cache_max_entries
+        self.ttl = ttl if ttl is not None else settings.semantic_cache_ttl
+        self.tool_ttls = tool_ttls if tool_ttls is not None else settings.semantic_cache_tool_ttls
+        
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * self.max_entries
+        self._size = 0
+        self._next = 0
+    
+    @property
+    def embeddings(self) -> Any:
+        """Embeddings model, created lazily so the API key is only needed when enabled."""
+        if self._embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+            self._embeddings = OpenAIEmbeddings(
+                model=settings.semantic_cache_embedding_model,
+                openai_api_key=settings.openai_api_key
+            )
+        return self._embeddings
+    
+    async def aembed(self, query: str) -> Optional[np.ndarray]:
+        """Embed a query for lookup and storage.
+        
+        Args:
+            query: User message
+        
+        Returns:
+            Normalized embedding vector, or None if embedding failed
+        """
+        try:
+            vector = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Semantic cache embedding failed: {str(e)}")
+            return None
+        
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def lookup(self, embedding: Optional[np.ndarray]) -> Optional[Dict[str, Any]]:
+        """Find a cached response for a query embedding.
+        
+        Args:
+            embedding: Normalized embedding from aembed
+        
+        Returns:
+            Dictionary with 'output' and 'tools_used', or None on a miss
+        """
+        if embedding is None or self._size == 0:
+            return None
+        
+        scores = self._vectors[:self._size] @ embedding
+        now = time.monotonic()
+        for index in np.argsort(scores)[::-1]:
+            if scores[index] < self.threshold:
+                break
+            entry = self._entries[index]
+            if entry["expires_at"] > now:
+                logger.debug(f"Semantic cache hit (similarity {scores[index]:.3f})")
+                return {"output": entry["output"], "tools_used": list(entry["tools_used"])}
+        
+        return None
+    
+    def add(
+        self,
+        embedding: Optional[np.ndarray],
+        output: str,
+        tools_used: List[str]
+    ) -> None:
+        """Store a response for a query embedding.
+        
+        Args:
+            embedding: Normalized embedding from aembed
+            output: Agent response
+            tools_used: Tools invoked to produce the response
+        """
+        if embedding is None:
+            return
+        
+        ttl = min([self.ttl] + [self.tool_ttls[t] for t in tools_used if t in self.tool_ttls])
+        if ttl <= 0:
+            return
+        
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+        
+        self._vectors[self._next] = embedding
+        self._entries[self._next] = {
+            "output": output,
+            "tools_used": list(tools_used),
+            "expires_at": time.monotonic() + ttl
+        }
+        self._next = (self._next + 1) % self.max_entries
+        self._size = min(self._size + 1, self.max_entries)
+    
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        self._entries = [None] * self.max_entries
+        self._size = 0
+        self._next = 0
+
+
+# Global semantic cache instance
+semantic_cache = SemanticCache()
@@ -1,7 +1,7 @@
 """Configuration management for the AI Chatbot Backend API."""
 
 import os
-from typing import Optional
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -17,6 +17,8 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     debug: bool = False
+    workers: Optional[int] = None  # Defaults to the CPU count; 1 in debug mode
+    thread_pool_size: int = 32  # Threads per worker for blocking I/O
     
     # Security
     api_key: Optional[str] = None
@@ -24,27 +26,61 @@ class Settings(BaseSettings):
     
     # OpenAI Configuration
     openai_api_key: Optional[str] = None
-    openai_model: str = "gpt-4"
+    openai_model: str = "gpt-4o-mini"
+    openai_model_fast: Optional[str] = None  # Enables routing short messages
+    openai_model_smart: Optional[str] = None
+    model_routing_max_chars: int = 200
     openai_temperature: float = 0.7
     openai_max_tokens: int = 1000
+    openai_http2: bool = True
+    openai_max_connections: int = 200
+    openai_max_keepalive_connections: int = 50
+    openai_keepalive_expiry: float = 60.0  # seconds
+    openai_timeout: float = 60.0  # seconds
+    openai_connect_timeout: float = 5.0  # seconds
+    
+    # LLM Response Cache
+    llm_cache_backend: str = "sqlite"  # sqlite, memory, redis or none
+    llm_cache_path: str = "db/llm_cache.db"
+    
+    # Tool Result Cache (TTL in seconds; tools without a TTL are cached until evicted)
+    tool_cache_enabled: bool = True
+    tool_cache_max_entries: int = 1024
+    tool_cache_ttls: Dict[str, int] = {"weather": 600, "web_search": 1800}
+    
+    # Semantic Response Cache
+    semantic_cache_enabled: bool = False
+    semantic_cache_embedding_model: str = "text-embedding-3-small"
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_max_entries: int = 1000
+    semantic_cache_ttl: int = 3600  # seconds
+    semantic_cache_tool_ttls: Dict[str, int] = {"weather": 600, "web_search": 1800}
     
     # LangChain Configuration
     agent_verbose: bool = False
     agent_max_iterations: int = 15
     agent_max_execution_time: Optional[int] = None
+    agent_warmup: bool = True
+    agent_stream_fast_path: bool = True
+    max_history_messages: int = 20  # 0 sends the full history
+    agent_system_prompt: Optional[str] = None  # Overrides the built-in prompt
     
     # Memory Configuration
     memory_type: str = "sqlite"  # sqlite or redis
-    sqlite_db_path: str = "db/conversations.db"
+    sqlite_db_path: str = "db/conversations.db"  # ":memory:" keeps it in process
+    sqlite_dump_path: Optional[str] = None  # Saves an in-memory database on shutdown; not reloaded
     redis_host: str = "localhost"
     redis_port: int = 6379
     redis_db: int = 0
     memory_ttl: int = 86400  # 24 hours in seconds
+    memory_write_retries: int = 3
+    memory_write_retry_delay: float = 0.1  # seconds, multiplied by attempt
     
     # Tool Configuration
     enable_web_search: bool = True
     enable_calculator: bool = True
     enable_weather: bool = True
+    tool_http_timeout: float = 5.0  # seconds
     
     # Logging
     log_level: str = "INFO"
@@ -1,11 +1,13 @@
 """FastAPI application entry point."""
 
+import asyncio
 import logging
 import uuid
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, BackgroundTasks
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
@@ -15,9 +17,10 @@ from src.models import (
     ChatRequest, ChatResponse, SessionCreate, SessionResponse,
     SessionListResponse, ToolsResponse, ErrorResponse
 )
-from src.agent import get_agent
+from src.agent import configure_llm_cache, get_agent, close_agent
+from src.cache import semantic_cache
 from src.memory import memory
-from src.tools import get_tool_info
+from src.tools import get_tool_info, close_http_clients
 
 # Configure logging
 logging.basicConfig(
@@ -42,6 +45,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Pre-encoded Server-Sent Events framing
+SSE_PREFIX = b"data: "
+SSE_SUFFIX = b"\n\n"
+SSE_DONE = b"data: [DONE]\n\n"
+
 # API key security (if enabled)
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
@@ -71,6 +79,45 @@ def verify_api_key(x_api_key: Optional[str] = Header(None)) -> bool:
     return True
 
 
+async def persist_messages(session_id: str, messages: List[Dict[str, Any]]) -> None:
+    """Save messages to memory in one transaction, retrying transient errors.
+    
+    Runs as a background task after the response has been sent, so
+    failures are logged rather than raised to the client.
+    
+    Args:
+        session_id: Session identifier
+        messages: List of dicts with 'role', 'content' and optional 'metadata'
+    """
+    attempts = max(1, settings.memory_write_retries)
+    for attempt in range(1, attempts + 1):
+        try:
+            await memory.aadd_messages(session_id, messages)
+            return
+        except Exception as e:
+            if attempt == attempts:
+                logger.error(
+                    f"Failed to save messages for session {session_id} "
+                    f"after {attempts} attempts: {str(e)}",
+                    exc_info=True
+                )
+                return
+            logger.warning(f"Retrying message save for session {session_id}: {str(e)}")
+            await asyncio.sleep(settings.memory_write_retry_delay * attempt)
+
+
+async def ensure_session(session_id: str) -> None:
+    """Create the session if it does not exist yet.
+    
+    Args:
+        session_id: Session identifier
+    """
+    session_info = await memory.aget_session_info(session_id)
+    if not session_info:
+        if await memory.acreate_session(session_id):
+            logger.info(f"Created new session: {session_id}")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup."""
@@ -78,10 +125,31 @@ async def startup_event():
     validate_settings()  # Validate settings on startup
     
     logger.info("Starting AI Chatbot Backend API...")
+    
+    # SQLite calls and blocking tools run via asyncio.to_thread; size the
+    # pool for the expected concurrency instead of the CPU-based default
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=settings.thread_pool_size, thread_name_prefix="io")
+    )
+    
+    configure_llm_cache()
+    agent = get_agent()  # Build the shared agent once, before the first request
+    if settings.agent_warmup:
+        await agent.warmup()
     logger.info(f"OpenAI Model: {settings.openai_model}")
     logger.info(f"Available tools: {len(get_tool_info())}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled resources on shutdown."""
+    await close_agent()
+    await close_http_clients()
+    
+    if memory.in_memory and settings.sqlite_dump_path:
+        await asyncio.to_thread(memory.dump_to_disk, settings.sqlite_dump_path)
+
+
 @app.get("/", tags=["Health"])
 async def root():
     """Root endpoint."""
@@ -101,51 +169,65 @@ async def health():
 @app.post("/chat", response_model=ChatResponse, tags=["Chat"])
 async def chat(
     request: ChatRequest,
+    background_tasks: BackgroundTasks,
     _: bool = Depends(verify_api_key)
 ):
     """Handle chat requests with tool calling and memory.
     
+    The user and assistant messages are persisted in a background task
+    once the response has been sent.
+    
     Args:
         request: Chat request with message and session ID
+        background_tasks: Tasks to run after the response is sent
         
     Returns:
         Chat response with assistant reply and tool usage info
     """
     try:
-        # Get or create session
-        session_info = memory.get_session_info(request.session_id)
-        if not session_info:
-            memory.create_session(request.session_id)
-            logger.info(f"Created new session: {request.session_id}")
-        
-        # Get chat history
-        chat_history = memory.get_messages(request.session_id)
-        
-        # Save user message
-        memory.add_message(
-            session_id=request.session_id,
-            role="user",
-            content=request.message
-        )
-        
-        # Get agent with optional overrides
-        agent = get_agent(
-            temperature=request.temperature,
-            max_tokens=request.max_tokens
-        )
-        
-        # Execute agent
-        result = agent.run(
-            user_input=request.message,
-            chat_history=chat_history
-        )
-        
-        # Save assistant response
-        memory.add_message(
-            session_id=request.session_id,
-            role="assistant",
-            content=result["output"],
-            metadata={"tools_used": result["tools_used"]}
+        # Only the chat history gates the LLM call
+        chat_history = await memory.aget_messages(request.session_id, settings.max_history_messages)
+        
+        # Paraphrases of a self-contained opening question can be answered
+        # from the semantic cache; follow-ups depend on history and skip it
+        embedding = None
+        cached = None
+        if settings.semantic_cache_enabled and not chat_history:
+            embedding = await semantic_cache.aembed(request.message)
+            cached = semantic_cache.lookup(embedding)
+        
+        if cached:
+            result = cached
+            await ensure_session(request.session_id)
+        else:
+            # Execute agent with optional overrides; session bookkeeping
+            # overlaps the LLM call instead of preceding it
+            agent = get_agent()
+            result, _ = await asyncio.gather(
+                agent.arun(
+                    user_input=request.message,
+                    chat_history=chat_history,
+                    temperature=request.temperature,
+                    max_tokens=request.max_tokens,
+                    model=request.model
+                ),
+                ensure_session(request.session_id)
+            )
+            if not result.get("error"):
+                semantic_cache.add(embedding, result["output"], result["tools_used"])
+        
+        # Save user message and assistant response after responding
+        background_tasks.add_task(
+            persist_messages,
+            request.session_id,
+            [
+                {"role": "user", "content": request.message},
+                {
+                    "role": "assistant",
+                    "content": result["output"],
+                    "metadata": {"tools_used": result["tools_used"]}
+                }
+            ]
         )
         
         return ChatResponse(
@@ -162,61 +244,59 @@ async def chat(
 @app.post("/chat/stream", tags=["Chat"])
 async def chat_stream(
     request: ChatRequest,
+    background_tasks: BackgroundTasks,
     _: bool = Depends(verify_api_key)
 ):
     """Stream chat responses using Server-Sent Events (SSE).
     
+    Messages are persisted in a background task once the stream has
+    been fully sent.
+    
     Args:
         request: Chat request with message and session ID
+        background_tasks: Tasks to run after the stream completes
         
     Returns:
         StreamingResponse with SSE formatted chunks
     """
     try:
-        # Get or create session
-        session_info = memory.get_session_info(request.session_id)
-        if not session_info:
-            memory.create_session(request.session_id)
-        
-        # Get chat history
-        chat_history = memory.get_messages(request.session_id)
-        
-        # Save user message
-        memory.add_message(
-            session_id=request.session_id,
-            role="user",
-            content=request.message
+        # Get chat history while making sure the session exists
+        chat_history, _ = await asyncio.gather(
+            memory.aget_messages(request.session_id, settings.max_history_messages),
+            ensure_session(request.session_id)
         )
         
         # Get agent
-        agent = get_agent(
-            temperature=request.temperature,
-            max_tokens=request.max_tokens
-        )
-        
-        # Collect full response for saving
-        full_response = ""
+        agent = get_agent()
         
         async def generate():
-            nonlocal full_response
+            # Collect chunks for saving; joined once the stream ends
+            chunks = []
             async for chunk in agent.astream(
                 user_input=request.message,
-                chat_history=chat_history
+                chat_history=chat_history,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                model=request.model
             ):
-                full_response += chunk
-                yield f"data: {chunk}\n\n"
+                chunks.append(chunk)
+                yield SSE_PREFIX + chunk.encode("utf-8") + SSE_SUFFIX
             
-            # Save assistant response after streaming completes
-            memory.add_message(
-                session_id=request.session_id,
-                role="assistant",
-                content=full_response
+            # Save both messages once the stream has been sent
+            background_tasks.add_task(
+                persist_messages,
+                request.session_id,
+                [
+                    {"role": "user", "content": request.message},
+                    {"role": "assistant", "content": "".join(chunks)}
+                ]
             )
-            yield "data: [DONE]\n\n"
+            yield SSE_DONE
         
         return StreamingResponse(
             generate(),
             media_type="text/event-stream",
+            background=background_tasks,
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
@@ -245,15 +325,15 @@ async def create_session(
     try:
         session_id = request.session_id or str(uuid.uuid4())
         
-        created = memory.create_session(session_id, request.metadata)
+        created = await memory.acreate_session(session_id, request.metadata)
         
-        session_info = memory.get_session_info(session_id)
+        session_info = await memory.aget_session_info(session_id)
         if not session_info:
             raise HTTPException(status_code=500, detail="Failed to create session")
         
         return SessionResponse(
             session_id=session_info["session_id"],
-            created_at=datetime.fromisoformat(session_info["created_at"].replace(" ", "T")),
+            created_at=session_info["created_at"],
             message_count=session_info["message_count"],
             metadata=session_info["metadata"]
         )
@@ -279,12 +359,12 @@ async def list_sessions(
         List of sessions
     """
     try:
-        sessions = memory.list_sessions(limit=limit, offset=offset)
+        sessions = await memory.alist_sessions(limit=limit, offset=offset)
         
         session_responses = [
             SessionResponse(
                 session_id=s["session_id"],
-                created_at=datetime.fromisoformat(s["created_at"].replace(" ", "T")),
+                created_at=s["created_at"],
                 message_count=s["message_count"],
                 metadata=s["metadata"]
             )
@@ -315,13 +395,13 @@ async def get_session(
         Session information
     """
     try:
-        session_info = memory.get_session_info(session_id)
+        session_info = await memory.aget_session_info(session_id)
         if not session_info:
             raise HTTPException(status_code=404, detail="Session not found")
         
         return SessionResponse(
             session_id=session_info["session_id"],
-            created_at=datetime.fromisoformat(session_info["created_at"].replace(" ", "T")),
+            created_at=session_info["created_at"],
             message_count=session_info["message_count"],
             metadata=session_info["metadata"]
         )
@@ -347,7 +427,7 @@ async def delete_session(
         Success message
     """
     try:
-        deleted = memory.delete_session(session_id)
+        deleted = await memory.adelete_session(session_id)
         if not deleted:
             raise HTTPException(status_code=404, detail="Session not found")
         
@@ -377,10 +457,23 @@ async def list_tools(_: bool = Depends(verify_api_key)):
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
+    
+    # Reload mode runs a single process, so extra workers only apply outside debug
+    workers = 1 if settings.debug else (settings.workers or os.cpu_count() or 1)
+    if settings.memory_type == "sqlite" and settings.sqlite_db_path == ":memory:" and workers > 1:
+        # Each worker would get its own private database, so sessions would
+        # only be visible to whichever worker created them
+        logger.warning("In-memory SQLite database cannot be shared between workers; using 1 worker")
+        workers = 1
     uvicorn.run(
         "src.main:app",
         host=settings.host,
         port=settings.port,
-        reload=settings.debug
+        reload=settings.debug,
+        workers=workers,
+        loop="auto",
+        http="auto",
+        log_level=settings.log_level.lower()
     )
@@ -1,16 +1,94 @@
 """Persistent memory management for conversation history."""
 
+import asyncio
 import sqlite3
 import json
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, Optional, Iterator, Union
+from datetime import datetime, timedelta
 from pathlib import Path
 
+import msgpack
+
 from src.config import settings
 
+# Rows written before msgpack hold JSON text metadata
+try:
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+# SQL statements are module constants so sqlite3's per-connection
+# statement cache reuses one prepared statement per query
+
+SQL_INSERT_SESSION = """
+    INSERT INTO sessions (session_id, created_at, metadata)
+    VALUES (?, ?, ?)
+"""
+
+SQL_ENSURE_SESSION = """
+    INSERT OR IGNORE INTO sessions (session_id, created_at)
+    VALUES (?, ?)
+"""
+
+SQL_INSERT_MESSAGE = """
+    INSERT INTO messages (session_id, role, content, metadata)
+    VALUES (?, ?, ?, ?)
+"""
+
+SQL_SELECT_MESSAGES = """
+    SELECT role, content, timestamp
+    FROM messages
+    WHERE session_id = ?
+    ORDER BY id
+"""
+
+# Newest first so only the requested rows are read
+SQL_SELECT_MESSAGES_LIMIT = """
+    SELECT role, content, timestamp
+    FROM messages
+    WHERE session_id = ?
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+_MESSAGE_KEYS = ("role", "content", "timestamp")
+
+SQL_SELECT_SESSION = """
+    SELECT session_id, created_at, updated_at, metadata, message_count
+    FROM sessions
+    WHERE session_id = ?
+"""
+
+SQL_LIST_SESSIONS = """
+    SELECT session_id, created_at, updated_at, metadata, message_count
+    FROM sessions
+    ORDER BY updated_at DESC
+    LIMIT ? OFFSET ?
+"""
+
+SQL_DELETE_SESSION = "DELETE FROM sessions WHERE session_id = ?"
+
+SQL_DELETE_OLD_SESSIONS = "DELETE FROM sessions WHERE updated_at < ?"
+
+
+def _pack_metadata(metadata: Optional[Dict[str, Any]]) -> bytes:
+    """Serialize metadata for storage as a msgpack BLOB."""
+    return msgpack.packb(metadata or {}, use_bin_type=True)
+
+
+def _unpack_metadata(value: Union[bytes, str, None]) -> Dict[str, Any]:
+    """Deserialize stored metadata, accepting both msgpack BLOBs and legacy JSON text."""
+    if not value:
+        return {}
+    if isinstance(value, bytes):
+        return msgpack.unpackb(value, raw=False, strict_map_key=False)
+    return _loads(value)
+
 
 class ConversationMemory:
     """Manages persistent conversation memory using SQLite."""
@@ -19,10 +97,26 @@ class ConversationMemory:
         """Initialize memory storage.
         
         Args:
-            db_path: Path to SQLite database file. Defaults to config setting.
+            db_path: Path to SQLite database file, or ":memory:" for a
+                database that lives only in this process. Defaults to config setting.
         """
         self.db_path = db_path or settings.sqlite_db_path
-        self._ensure_db_directory()
+        self.in_memory = self.db_path == ":memory:"
+        if not self.in_memory:
+            self._ensure_db_directory()
+        
+        # Each thread lazily opens one long-lived connection, so concurrent
+        # requests do not serialize behind a shared one; WAL mode lets their
+        # reads proceed while another thread writes
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        
+        # An in-memory database exists only inside its connection, so all
+        # threads share that one and take turns under the lock
+        self._shared_conn = self._connect() if self.in_memory else None
+        self._lock = threading.RLock() if self.in_memory else nullcontext()
+        
         self._init_database()
     
     def _ensure_db_directory(self) -> None:
@@ -30,42 +124,171 @@ class ConversationMemory:
         db_dir = Path(self.db_path).parent
         db_dir.mkdir(parents=True, exist_ok=True)
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open a database connection with the performance pragmas applied.
+        
+        Returns:
+            Connection in autocommit mode; transactions are explicit
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        # WAL lets readers run alongside a writer; with synchronous=NORMAL a
+        # commit no longer waits for an fsync of the main database file
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+    
+    def _conn(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, opening it on first use."""
+        if self._shared_conn is not None:
+            return self._shared_conn
+        
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow the thread's connection for a single statement or query."""
+        with self._lock:
+            yield self._conn()
+    
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Borrow the thread's connection inside an explicit write transaction.
+        
+        The write lock is taken up front (BEGIN IMMEDIATE), so a concurrent
+        writer waits on busy_timeout instead of failing mid-transaction.
+        """
+        with self._lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    
+    def close(self) -> None:
+        """Close the connections opened by all threads."""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+        
+        if self._shared_conn is not None:
+            with self._lock:
+                self._shared_conn.close()
+    
+    def dump_to_disk(self, path: str) -> None:
+        """Copy the database into a file, e.g. to keep an in-memory database on shutdown.
+        
+        The copy is never loaded back at startup; point SQLITE_DB_PATH at it
+        to continue from the saved conversations.
+        
+        Args:
+            path: Destination SQLite database file; an existing file is overwritten
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        target = sqlite3.connect(path)
+        try:
+            with self._connection() as conn:
+                conn.backup(target)
+        finally:
+            target.close()
+        
+        logger.info(f"Database copied to {path}")
+    
     def _init_database(self) -> None:
         """Initialize the database schema."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create sessions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sessions (
-                session_id TEXT PRIMARY KEY,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                metadata TEXT DEFAULT '{}'
-            )
-        """)
-        
-        # Create messages table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT NOT NULL,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                metadata TEXT DEFAULT '{}',
-                FOREIGN KEY (session_id) REFERENCES sessions(session_id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create indexes
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_messages_session 
-            ON messages(session_id, timestamp)
-        """)
-        
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            cursor = conn.cursor()
+            
+            # Create sessions table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    metadata BLOB DEFAULT X'',
+                    message_count INTEGER DEFAULT 0
+                )
+            """)
+            
+            # Databases created before message_count existed get the column
+            # and a one-time backfill
+            columns = [row[1] for row in cursor.execute("PRAGMA table_info(sessions)")]
+            if "message_count" not in columns:
+                cursor.execute("ALTER TABLE sessions ADD COLUMN message_count INTEGER DEFAULT 0")
+                cursor.execute("""
+                    UPDATE sessions
+                    SET message_count = (
+                        SELECT COUNT(*) FROM messages WHERE messages.session_id = sessions.session_id
+                    )
+                """)
+            
+            # Create messages table
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    metadata BLOB DEFAULT X'',
+                    FOREIGN KEY (session_id) REFERENCES sessions(session_id) ON DELETE CASCADE
+                )
+            """)
+            
+            # Create indexes
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_messages_session
+                ON messages(session_id, timestamp)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_messages_session_id
+                ON messages(session_id, id DESC)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_sessions_updated
+                ON sessions(updated_at)
+            """)
+            
+            # Keep the session's message count and activity timestamp
+            # current so reads never aggregate over messages
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_msg_ins
+                AFTER INSERT ON messages
+                BEGIN
+                    UPDATE sessions
+                    SET message_count = message_count + 1,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE session_id = NEW.session_id;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_msg_del
+                AFTER DELETE ON messages
+                BEGIN
+                    UPDATE sessions
+                    SET message_count = message_count - 1
+                    WHERE session_id = OLD.session_id;
+                END
+            """)
+        
         logger.info(f"Database initialized at {self.db_path}")
     
     def create_session(self, session_id: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
@@ -74,32 +297,23 @@ class ConversationMemory:
         Args:
             session_id: Unique session identifier
             metadata: Optional session metadata
-            
+        
         Returns:
             True if session was created, False if it already exists
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            metadata_json = json.dumps(metadata or {})
-            cursor.execute("""
-                INSERT INTO sessions (session_id, metadata)
-                VALUES (?, ?)
-            """, (session_id, metadata_json))
-            conn.commit()
-            logger.info(f"Created session: {session_id}")
-            return True
-        except sqlite3.IntegrityError:
-            logger.debug(f"Session already exists: {session_id}")
-            return False
-        finally:
-            conn.close()
+        with self._connection() as conn:
+            try:
+                conn.execute(SQL_INSERT_SESSION, (session_id, datetime.utcnow().isoformat(), _pack_metadata(metadata)))
+                logger.info(f"Created session: {session_id}")
+                return True
+            except sqlite3.IntegrityError:
+                logger.debug(f"Session already exists: {session_id}")
+                return False
     
     def add_message(
-        self, 
-        session_id: str, 
-        role: str, 
+        self,
+        session_id: str,
+        role: str,
         content: str,
         metadata: Optional[Dict[str, Any]] = None
     ) -> None:
@@ -111,107 +325,80 @@ class ConversationMemory:
             content: Message content
             metadata: Optional message metadata
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Shares the batch path, which ensures the session with INSERT OR
+        # IGNORE in the same transaction as the message insert
+        self.add_messages(session_id, [
+            {"role": role, "content": content, "metadata": metadata}
+        ])
+    
+    def add_messages(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Add several messages to a session in a single transaction.
         
-        try:
-            # Ensure session exists
-            self.create_session(session_id)
-            
-            # Update session timestamp
-            cursor.execute("""
-                UPDATE sessions 
-                SET updated_at = CURRENT_TIMESTAMP 
-                WHERE session_id = ?
-            """, (session_id,))
+        Args:
+            session_id: Session identifier
+            messages: List of dicts with 'role', 'content' and optional 'metadata'
+        """
+        with self._transaction() as conn:
+            cursor = conn.cursor()
             
-            # Insert message
-            metadata_json = json.dumps(metadata or {})
-            cursor.execute("""
-                INSERT INTO messages (session_id, role, content, metadata)
-                VALUES (?, ?, ?, ?)
-            """, (session_id, role, content, metadata_json))
+            # Ensure session exists
+            cursor.execute(SQL_ENSURE_SESSION, (session_id, datetime.utcnow().isoformat()))
             
-            conn.commit()
-            logger.debug(f"Added {role} message to session {session_id}")
-        finally:
-            conn.close()
+            # Insert messages; trg_msg_ins updates the session's count and timestamp
+            cursor.executemany(SQL_INSERT_MESSAGE, [
+                (session_id, message["role"], message["content"], _pack_metadata(message.get("metadata")))
+                for message in messages
+            ])
+        
+        logger.debug(f"Added {len(messages)} messages to session {session_id}")
     
     def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """Retrieve conversation history for a session.
         
         Args:
             session_id: Session identifier
-            limit: Optional limit on number of messages to retrieve
-            
+            limit: Optional limit on number of messages to retrieve; the most
+                recent messages are returned
+        
         Returns:
-            List of message dictionaries with role, content, and timestamp
+            List of message dictionaries with role, content, and timestamp, oldest first
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            if not limit:
+                rows = conn.execute(SQL_SELECT_MESSAGES, (session_id,)).fetchall()
+            else:
+                rows = conn.execute(SQL_SELECT_MESSAGES_LIMIT, (session_id, limit)).fetchall()
+                rows.reverse()  # Restore chronological order
         
-        try:
-            query = """
-                SELECT role, content, timestamp 
-                FROM messages 
-                WHERE session_id = ? 
-                ORDER BY timestamp ASC
-            """
-            params = (session_id,)
-            
-            if limit:
-                query += " LIMIT ?"
-                params = (session_id, limit)
-            
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            messages = [
-                {
-                    "role": row[0],
-                    "content": row[1],
-                    "timestamp": row[2]
-                }
-                for row in rows
-            ]
-            
-            return messages
-        finally:
-            conn.close()
+        return [dict(zip(_MESSAGE_KEYS, row)) for row in rows]
+    
+    @staticmethod
+    def _session_from_row(row: tuple) -> Dict[str, Any]:
+        """Convert a sessions row into a session info dict."""
+        return {
+            "session_id": row[0],
+            "created_at": row[1],
+            "updated_at": row[2],
+            "metadata": _unpack_metadata(row[3]),
+            "message_count": row[4]
+        }
     
     def get_session_info(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session information.
         
         Args:
             session_id: Session identifier
-            
+        
         Returns:
             Session info dict or None if not found
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            row = conn.execute(SQL_SELECT_SESSION, (session_id,)).fetchone()
         
-        try:
-            cursor.execute("""
-                SELECT session_id, created_at, updated_at, metadata,
-                       (SELECT COUNT(*) FROM messages WHERE messages.session_id = sessions.session_id) as message_count
-                FROM sessions
-                WHERE session_id = ?
-            """, (session_id,))
-            
-            row = cursor.fetchone()
-            if not row:
-                return None
-            
-            return {
-                "session_id": row[0],
-                "created_at": row[1],
-                "updated_at": row[2],
-                "metadata": json.loads(row[3] or "{}"),
-                "message_count": row[4]
-            }
-        finally:
-            conn.close()
+        if not row:
+            return None
+        
+        return self._session_from_row(row)
     
     def list_sessions(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
         """List all sessions.
@@ -219,89 +406,92 @@ class ConversationMemory:
         Args:
             limit: Maximum number of sessions to return
             offset: Offset for pagination
-            
+        
         Returns:
             List of session info dictionaries
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self._connection() as conn:
+            rows = conn.execute(SQL_LIST_SESSIONS, (limit, offset)).fetchall()
         
-        try:
-            cursor.execute("""
-                SELECT session_id, created_at, updated_at, metadata,
-                       (SELECT COUNT(*) FROM messages WHERE messages.session_id = sessions.session_id) as message_count
-                FROM sessions
-                ORDER BY updated_at DESC
-                LIMIT ? OFFSET ?
-            """, (limit, offset))
-            
-            rows = cursor.fetchall()
-            sessions = [
-                {
-                    "session_id": row[0],
-                    "created_at": row[1],
-                    "updated_at": row[2],
-                    "metadata": json.loads(row[3] or "{}"),
-                    "message_count": row[4]
-                }
-                for row in rows
-            ]
-            
-            return sessions
-        finally:
-            conn.close()
+        return [self._session_from_row(row) for row in rows]
     
     def delete_session(self, session_id: str) -> bool:
         """Delete a session and all its messages.
         
         Args:
             session_id: Session identifier
-            
+        
         Returns:
             True if session was deleted, False if not found
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        with self._connection() as conn:
+            cursor = conn.execute(SQL_DELETE_SESSION, (session_id,))
             deleted = cursor.rowcount > 0
-            conn.commit()
-            
-            if deleted:
-                logger.info(f"Deleted session: {session_id}")
-            
-            return deleted
-        finally:
-            conn.close()
+        
+        if deleted:
+            logger.info(f"Deleted session: {session_id}")
+        
+        return deleted
     
     def clear_old_sessions(self, days: int = 30) -> int:
         """Clear sessions older than specified days.
         
         Args:
             days: Number of days to keep sessions
-            
+        
         Returns:
             Number of sessions deleted
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Same format as CURRENT_TIMESTAMP, so the comparison can use
+        # idx_sessions_updated
+        cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat(" ", timespec="seconds")
         
-        try:
-            cursor.execute("""
-                DELETE FROM sessions 
-                WHERE updated_at < datetime('now', '-' || ? || ' days')
-            """, (days,))
-            
+        with self._connection() as conn:
+            cursor = conn.execute(SQL_DELETE_OLD_SESSIONS, (cutoff,))
             deleted = cursor.rowcount
-            conn.commit()
-            
-            if deleted > 0:
-                logger.info(f"Cleared {deleted} old sessions (older than {days} days)")
-            
-            return deleted
-        finally:
-            conn.close()
+        
+        if deleted > 0:
+            logger.info(f"Cleared {deleted} old sessions (older than {days} days)")
+        
+        return deleted
+    
+    async def acreate_session(self, session_id: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """Async version of create_session, run in a worker thread."""
+        return await asyncio.to_thread(self.create_session, session_id, metadata)
+    
+    async def aadd_message(
+        self,
+        session_id: str,
+        role: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Async version of add_message, run in a worker thread."""
+        await asyncio.to_thread(self.add_message, session_id, role, content, metadata)
+    
+    async def aadd_messages(self, session_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Async version of add_messages, run in a worker thread."""
+        await asyncio.to_thread(self.add_messages, session_id, messages)
+    
+    async def aget_messages(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Async version of get_messages, run in a worker thread."""
+        return await asyncio.to_thread(self.get_messages, session_id, limit)
+    
+    async def aget_session_info(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Async version of get_session_info, run in a worker thread."""
+        return await asyncio.to_thread(self.get_session_info, session_id)
+    
+    async def alist_sessions(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """Async version of list_sessions, run in a worker thread."""
+        return await asyncio.to_thread(self.list_sessions, limit, offset)
+    
+    async def adelete_session(self, session_id: str) -> bool:
+        """Async version of delete_session, run in a worker thread."""
+        return await asyncio.to_thread(self.delete_session, session_id)
+    
+    async def aclear_old_sessions(self, days: int = 30) -> int:
+        """Async version of clear_old_sessions, run in a worker thread."""
+        return await asyncio.to_thread(self.clear_old_sessions, days)
 
 
 # Global memory instance
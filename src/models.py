@@ -1,6 +1,6 @@
 """Pydantic models for API request and response schemas."""
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -19,6 +19,7 @@ class ChatRequest(BaseModel):
     stream: bool = Field(default=False, description="Whether to stream the response")
     temperature: Optional[float] = Field(None, ge=0.0, le=2.0, description="Override temperature")
     max_tokens: Optional[int] = Field(None, ge=1, le=4000, description="Override max tokens")
+    model: Optional[Literal["fast", "smart"]] = Field(None, description="Override model tier")
 
 
 class ChatResponse(BaseModel):
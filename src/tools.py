@@ -1,17 +1,198 @@
 """Custom tools for the AI agent."""
 
+import ast
 import json
 import logging
+import math
+import operator
 import re
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from langchain.tools import BaseTool
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain_community.tools.convert_to_openai import format_tool_to_openai_tool
 from pydantic import BaseModel, Field
 
+from src.cache import TTLCache
 from src.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Shared HTTP session so repeated tool calls reuse keep-alive connections
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+_HTTPX: Optional[httpx.AsyncClient] = None
+
+# Largest integer result, in bits, the calculator computes; bigger values
+# could tie up the worker for seconds and cannot be printed anyway
+_MAX_RESULT_BITS = 10000
+
+
+def _number(value: Any) -> Any:
+    """Ensure an arithmetic operand is a number, not a list."""
+    if not isinstance(value, (int, float)):
+        raise ValueError("arithmetic is only supported on numbers")
+    return value
+
+
+def _check_size(value: Any) -> Any:
+    """Reject integer results larger than _MAX_RESULT_BITS."""
+    if isinstance(value, int) and value.bit_length() > _MAX_RESULT_BITS:
+        raise ValueError("result is too large")
+    return value
+
+
+def _multiply(left: Any, right: Any) -> Any:
+    """Multiply two numbers, rejecting results that are too large."""
+    return _check_size(operator.mul(left, right))
+
+
+def _power(base: Any, exponent: Any, modulus: Optional[int] = None) -> Any:
+    """Raise base to exponent, rejecting results too large to compute quickly.
+    
+    The size of the result is estimated before computing it, so both huge
+    exponents and already huge bases are caught.
+    """
+    if modulus is not None:
+        return pow(base, exponent, modulus)
+    if exponent > 0 and abs(base) > 1 and exponent * math.log2(abs(base)) > _MAX_RESULT_BITS:
+        raise ValueError(f"{base} ** {exponent} is too large")
+    return operator.pow(base, exponent)
+
+
+def _round(number: Any, ndigits: Optional[int] = None) -> Any:
+    """Round a number; negative ndigits on integers computes 10 ** -ndigits."""
+    if ndigits is not None and ndigits < 0:
+        _power(10, -ndigits)
+    return round(number, ndigits)
+
+
+# Operators and functions available to calculator expressions
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _multiply,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _power,
+}
+
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+_ALLOWED_NAMES = {
+    "abs": abs,
+    "round": _round,
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "pow": _power,
+    "sqrt": math.sqrt,
+}
+
+# Functions that take a list of numbers, e.g. sum([1, 2, 3])
+_SEQUENCE_FUNCTIONS = {"min", "max", "sum"}
+
+# A comma between digits followed by exactly three digits, as in 1,234
+_THOUSANDS_SEPARATOR = re.compile(r"(?<=\d),(?=\d{3}(?!\d))")
+
+
+def _strip_thousands_separators(expression: str) -> str:
+    """Remove thousands separators outside function calls.
+    
+    Commas inside parentheses or brackets separate arguments and are kept,
+    so '1,234 * 5' becomes '1234 * 5' while 'max(1,234)' is unchanged.
+    """
+    chars = []
+    depth = 0
+    for i, char in enumerate(expression):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0 and _THOUSANDS_SEPARATOR.match(expression, i):
+            continue
+        chars.append(char)
+    return "".join(chars)
+
+
+def _compile_node(node: ast.AST) -> Callable[[], Any]:
+    """Compile an expression AST node into a closure that evaluates it.
+    
+    Args:
+        node: Node of a parsed expression
+        
+    Returns:
+        Zero-argument function returning the node's value
+    """
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        value = node.value
+        return lambda: value
+    
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPERATORS:
+        op = _BINARY_OPERATORS[type(node.op)]
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda: op(_number(left()), _number(right()))
+    
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPERATORS:
+        op = _UNARY_OPERATORS[type(node.op)]
+        operand = _compile_node(node.operand)
+        return lambda: op(operand())
+    
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id in _ALLOWED_NAMES
+        and not node.keywords
+    ):
+        func = _ALLOWED_NAMES[node.func.id]
+        args = [
+            _compile_sequence(arg)
+            if node.func.id in _SEQUENCE_FUNCTIONS and isinstance(arg, (ast.List, ast.Tuple))
+            else _compile_node(arg)
+            for arg in node.args
+        ]
+        return lambda: func(*[arg() for arg in args])
+    
+    raise ValueError(f"unsupported expression element '{type(node).__name__}'")
+
+
+def _compile_sequence(node: ast.AST) -> Callable[[], Any]:
+    """Compile a list or tuple argument of min, max or sum.
+    
+    Args:
+        node: List or Tuple node passed directly to a sequence function
+        
+    Returns:
+        Zero-argument function returning the list of element values
+    """
+    elements = [_compile_node(element) for element in node.elts]
+    return lambda: [_number(element()) for element in elements]
+
+
+@lru_cache(maxsize=1024)
+def _compile_expression(expression: str) -> Callable[[], Any]:
+    """Parse and compile a calculator expression, memoized by its text.
+    
+    Only numbers, arithmetic operators and the functions in _ALLOWED_NAMES
+    are accepted, so no code is ever passed to eval.
+    
+    Args:
+        expression: Mathematical expression
+        
+    Returns:
+        Zero-argument function returning the expression's value
+    """
+    tree = ast.parse(_strip_thousands_separators(expression.strip()), mode="eval")
+    compiled = _compile_node(tree.body)
+    return lambda: _number(compiled())
+
 
 class CalculatorInput(BaseModel):
     """Input schema for calculator tool."""
@@ -39,22 +220,7 @@ class CalculatorTool(BaseTool):
             Result of the calculation as a string
         """
         try:
-            # Sanitize input - only allow safe mathematical operations
-            # Remove any potentially dangerous functions
-            sanitized = re.sub(r'[^0-9+\-*/().\s]', '', expression)
-            
-            # Use eval with limited builtins for safety
-            allowed_names = {
-                "__builtins__": {},
-                "abs": abs,
-                "round": round,
-                "min": min,
-                "max": max,
-                "sum": sum,
-                "pow": pow,
-            }
-            
-            result = eval(sanitized, allowed_names)
+            result = _compile_expression(expression)()
             logger.info(f"Calculator: {expression} = {result}")
             return str(result)
         except Exception as e:
@@ -67,6 +233,54 @@ class CalculatorTool(BaseTool):
         return self._run(expression)
 
 
+# Using DuckDuckGo Instant Answer API (no API key required)
+_DDG_URL = "https://api.duckduckgo.com/"
+
+
+def _ddg_params(query: str) -> Dict[str, str]:
+    """Build the DuckDuckGo Instant Answer query parameters."""
+    return {
+        "q": query,
+        "format": "json",
+        "no_html": "1",
+        "skip_disambig": "1"
+    }
+
+
+def _format_ddg(data: Dict[str, Any], query: str) -> str:
+    """Format a DuckDuckGo Instant Answer response as search results.
+    
+    Args:
+        data: Decoded API response
+        query: Search query string
+        
+    Returns:
+        Search results as a formatted string
+    """
+    results = []
+    
+    # Extract abstract if available
+    if data.get("AbstractText"):
+        results.append(f"Summary: {data['AbstractText']}")
+    
+    # Extract related topics
+    if data.get("RelatedTopics"):
+        topics = data["RelatedTopics"][:3]  # Limit to 3 results
+        for topic in topics:
+            if isinstance(topic, dict) and "Text" in topic:
+                results.append(f"- {topic['Text']}")
+    
+    # Extract answer if available
+    if data.get("Answer"):
+        results.insert(0, f"Answer: {data['Answer']}")
+    
+    if not results:
+        return f"No results found for query: {query}"
+    
+    logger.info(f"Web search completed for: {query}")
+    return "\n".join(results)
+
+
 class WebSearchInput(BaseModel):
     """Input schema for web search tool."""
     query: str = Field(..., description="Search query string")
@@ -93,42 +307,9 @@ class WebSearchTool(BaseTool):
             Search results as a formatted string
         """
         try:
-            # Using DuckDuckGo Instant Answer API (no API key required)
-            url = "https://api.duckduckgo.com/"
-            params = {
-                "q": query,
-                "format": "json",
-                "no_html": "1",
-                "skip_disambig": "1"
-            }
-            
-            response = requests.get(url, params=params, timeout=5)
+            response = _HTTP.get(_DDG_URL, params=_ddg_params(query), timeout=settings.tool_http_timeout)
             response.raise_for_status()
-            data = response.json()
-            
-            results = []
-            
-            # Extract abstract if available
-            if data.get("AbstractText"):
-                results.append(f"Summary: {data['AbstractText']}")
-            
-            # Extract related topics
-            if data.get("RelatedTopics"):
-                topics = data["RelatedTopics"][:3]  # Limit to 3 results
-                for topic in topics:
-                    if isinstance(topic, dict) and "Text" in topic:
-                        results.append(f"- {topic['Text']}")
-            
-            # Extract answer if available
-            if data.get("Answer"):
-                results.insert(0, f"Answer: {data['Answer']}")
-            
-            if not results:
-                return f"No results found for query: {query}"
-            
-            result_text = "\n".join(results)
-            logger.info(f"Web search completed for: {query}")
-            return result_text
+            return _format_ddg(response.json(), query)
             
         except requests.exceptions.RequestException as e:
             error_msg = f"Error searching web for '{query}': {str(e)}"
@@ -140,8 +321,24 @@ class WebSearchTool(BaseTool):
             return error_msg
     
     async def _arun(self, query: str) -> str:
-        """Async version of the tool."""
-        return self._run(query)
+        """Async version of the tool.
+        
+        Uses the shared async HTTP client, so the request never blocks the
+        event loop and parallel tool calls in one agent turn overlap.
+        """
+        try:
+            response = await get_async_http_client().get(_DDG_URL, params=_ddg_params(query))
+            response.raise_for_status()
+            return _format_ddg(response.json(), query)
+            
+        except httpx.HTTPError as e:
+            error_msg = f"Error searching web for '{query}': {str(e)}"
+            logger.error(error_msg)
+            return error_msg
+        except Exception as e:
+            error_msg = f"Unexpected error in web search: {str(e)}"
+            logger.error(error_msg)
+            return error_msg
 
 
 class WeatherInput(BaseModel):
@@ -207,24 +404,186 @@ class WeatherTool(BaseTool):
         return self._run(location)
 
 
-def get_available_tools() -> list[BaseTool]:
-    """Get list of available tools based on configuration.
+# Prefixes of the error strings the tools return instead of raising
+_ERROR_PREFIXES = ("Error", "Unexpected error")
+
+
+class CachedTool(BaseTool):
+    """Wraps a tool and memoizes its results by arguments.
+    
+    The wrapper keeps the wrapped tool's name, description and schema, so it
+    is interchangeable with it for the agent. Error results are not cached.
+    """
+    
+    tool: BaseTool
+    cache: TTLCache
+    args_schema: Optional[type[BaseModel]] = None
+    
+    def __init__(self, tool: BaseTool, cache: TTLCache, **kwargs: Any):
+        """Initialize the wrapper.
+        
+        Args:
+            tool: Tool to wrap
+            cache: Cache holding the tool's results
+        """
+        super().__init__(
+            tool=tool,
+            cache=cache,
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            **kwargs
+        )
+    
+    def _cache_key(self, args: tuple, kwargs: Dict[str, Any]) -> str:
+        """Build the cache key for a call."""
+        return json.dumps([self.name, args, kwargs], sort_keys=True, default=str)
+    
+    def _store(self, key: str, result: Any) -> None:
+        """Cache a result unless the tool reported an error."""
+        if not (isinstance(result, str) and result.startswith(_ERROR_PREFIXES)):
+            self.cache.set(key, result)
+    
+    def _run(
+        self,
+        *args: Any,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+        **kwargs: Any
+    ) -> Any:
+        """Return the cached result or run the wrapped tool."""
+        key = self._cache_key(args, kwargs)
+        result = self.cache.get(key)
+        if result is not None:
+            logger.debug(f"Tool cache hit: {self.name}")
+            return result
+        
+        result = self.tool._run(*args, **kwargs)
+        self._store(key, result)
+        return result
+    
+    async def _arun(
+        self,
+        *args: Any,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+        **kwargs: Any
+    ) -> Any:
+        """Async version of the tool."""
+        key = self._cache_key(args, kwargs)
+        result = self.cache.get(key)
+        if result is not None:
+            logger.debug(f"Tool cache hit: {self.name}")
+            return result
+        
+        result = await self.tool._arun(*args, **kwargs)
+        self._store(key, result)
+        return result
+
+
+def with_result_cache(tool: BaseTool) -> BaseTool:
+    """Wrap a tool in a result cache using the configured TTL for its name.
+    
+    Args:
+        tool: Tool to wrap
     
     Returns:
-        List of tool instances
+        The cached tool, or the tool itself if tool caching is disabled
     """
+    if not settings.tool_cache_enabled:
+        return tool
+    
+    cache = TTLCache(
+        max_entries=settings.tool_cache_max_entries,
+        ttl=settings.tool_cache_ttls.get(tool.name)
+    )
+    return CachedTool(tool, cache)
+
+
+def _tool_flags() -> tuple[bool, bool, bool]:
+    """Get the tool settings that determine the available tools."""
+    return (settings.enable_calculator, settings.enable_web_search, settings.enable_weather)
+
+
+@lru_cache(maxsize=None)
+def _build_tools(
+    enable_calculator: bool,
+    enable_web_search: bool,
+    enable_weather: bool
+) -> list[BaseTool]:
+    """Instantiate the tools for one combination of tool settings."""
     tools = []
     
-    if settings.enable_calculator:
+    if enable_calculator:
         tools.append(CalculatorTool())
     
-    if settings.enable_web_search:
+    if enable_web_search:
         tools.append(WebSearchTool())
     
-    if settings.enable_weather:
+    if enable_weather:
         tools.append(WeatherTool())
     
-    return tools
+    return [with_result_cache(tool) for tool in tools]
+
+
+def get_available_tools() -> list[BaseTool]:
+    """Get list of available tools based on configuration.
+    
+    The tools are built once per combination of the enable_* settings and
+    shared, so changing a setting takes effect on the next call.
+    
+    Returns:
+        List of tool instances
+    """
+    return _build_tools(*_tool_flags())
+
+
+@lru_cache(maxsize=None)
+def _build_tool_schemas(*flags: bool) -> list[Dict[str, Any]]:
+    """Format the OpenAI schemas for one combination of tool settings."""
+    return [format_tool_to_openai_tool(tool) for tool in _build_tools(*flags)]
+
+
+def get_openai_tool_schemas() -> list[Dict[str, Any]]:
+    """Get OpenAI tool-calling schemas for the available tools.
+    
+    Returns:
+        List of OpenAI tool definitions
+    """
+    return _build_tool_schemas(*_tool_flags())
+
+
+@lru_cache(maxsize=None)
+def _schema_for(schema_cls: Optional[type[BaseModel]]) -> Dict[str, Any]:
+    """Get the JSON schema of a tool input model, generated once per model.
+    
+    Args:
+        schema_cls: Tool args schema, or None for tools without one
+        
+    Returns:
+        JSON schema dictionary
+    """
+    if schema_cls is None:
+        return {}
+    return schema_cls.model_json_schema()
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Get or create the shared async HTTP client used by the tools.
+    
+    Returns:
+        Async HTTP client instance
+    """
+    global _HTTPX
+    if _HTTPX is None:
+        _HTTPX = httpx.AsyncClient(timeout=settings.tool_http_timeout, http2=True)
+    return _HTTPX
+
+
+async def close_http_clients() -> None:
+    """Close the shared async HTTP client used by the tools, if it was created."""
+    global _HTTPX
+    if _HTTPX is not None:
+        await _HTTPX.aclose()
+        _HTTPX = None
 
 
 def get_tool_info() -> list[Dict[str, Any]]:
@@ -238,7 +597,7 @@ def get_tool_info() -> list[Dict[str, Any]]:
         {
             "name": tool.name,
             "description": tool.description,
-            "parameters": tool.args_schema.schema() if hasattr(tool, 'args_schema') else {}
+            "parameters": _schema_for(getattr(tool, 'args_schema', None))
         }
         for tool in tools
     ]
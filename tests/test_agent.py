@@ -0,0 +1,194 @@
+"""Unit tests for agent module."""
+
+import json
+
+import pytest
+from unittest.mock import patch
+
+from src.agent import ChatAgent, ToolUsageCallbackHandler
+from src.config import settings
+
+
+TOOL_CALL = {
+    "tool_calls": [{
+        "index": 0,
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "calculator", "arguments": json.dumps({"expression": "2 + 3"})}
+    }]
+}
+
+
+def completion(*deltas):
+    """Build a chat completion response from streamed deltas."""
+    message = {"role": "assistant", "content": "".join(d.get("content", "") for d in deltas) or None}
+    tool_calls = [
+        {key: value for key, value in call.items() if key != "index"}
+        for delta in deltas for call in delta.get("tool_calls", [])
+    ]
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+    }
+
+
+async def stream(*deltas):
+    """Build a streamed chat completion for the fake OpenAI client."""
+    for delta in deltas:
+        yield {
+            "id": "chatcmpl-test",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": None, "delta": delta}]
+        }
+
+
+def make_agent(**overrides):
+    """Create an agent whose OpenAI client replays queued responses.
+    
+    Each queued response is a list of deltas, returned as a stream or as a
+    single completion depending on the request.
+    
+    Args:
+        overrides: Settings to patch while the agent is built
+    """
+    with patch.multiple(settings, openai_api_key="sk-test", **overrides):
+        chat_agent = ChatAgent()
+    
+    chat_agent.responses = []
+    chat_agent.calls = []
+    
+    async def create(**params):
+        chat_agent.calls.append(params)
+        deltas = chat_agent.responses.pop(0)
+        return stream(*deltas) if params.get("stream") else completion(*deltas)
+    
+    chat_agent.openai_async_client.chat.completions.create = create
+    return chat_agent
+
+
+@pytest.fixture
+def agent():
+    """Create an agent backed by a fake OpenAI client."""
+    return make_agent()
+
+
+async def collect(chunks):
+    """Gather an async iterator into a list."""
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.asyncio
+async def test_astream_without_tools(agent):
+    """Test replies without tool calls stream straight from the LLM."""
+    agent.responses = [[{"role": "assistant", "content": "Hel"}, {"content": "lo"}]]
+    
+    assert await collect(agent.astream("Hi")) == ["Hel", "lo"]
+    assert len(agent.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_astream_tool_call_first(agent):
+    """Test a tool call hands the turn to the agent executor."""
+    agent.responses = [
+        [{"role": "assistant", **TOOL_CALL}],
+        [{"role": "assistant", **TOOL_CALL}],
+        [{"role": "assistant", "content": "The answer is 5"}]
+    ]
+    
+    assert await collect(agent.astream("What is 2 + 3?")) == ["The answer is 5"]
+    assert len(agent.calls) == 3
+    assert agent.calls[2]["messages"][-1]["content"] == "5"
+
+
+@pytest.mark.asyncio
+async def test_astream_text_then_tool_call(agent):
+    """Test a tool call after streamed text still runs the tool."""
+    agent.responses = [
+        [{"role": "assistant", "content": "Let me check."}, TOOL_CALL],
+        [{"role": "assistant", **TOOL_CALL}],
+        [{"role": "assistant", "content": "The answer is 5"}]
+    ]
+    
+    chunks = await collect(agent.astream("What is 2 + 3?"))
+    assert chunks == ["Let me check.", "\n\n", "The answer is 5"]
+    assert len(agent.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_arun_sends_overrides(agent):
+    """Test per-call temperature and max_tokens reach the OpenAI request."""
+    agent.responses = [[{"role": "assistant", "content": "Hi"}]]
+    
+    result = await agent.arun("Hello", temperature=0.2, max_tokens=50)
+    
+    assert result["output"] == "Hi"
+    assert agent.calls[0]["temperature"] == 0.2
+    assert agent.calls[0]["max_tokens"] == 50
+
+
+@pytest.fixture
+def routed_agent():
+    """Create an agent with fast and smart model tiers configured."""
+    return make_agent(openai_model_fast="gpt-fast", openai_model_smart="gpt-smart")
+
+
+def test_select_model_without_tiers(agent):
+    """Test the default model is used when no tiers are configured."""
+    assert agent.select_model("Hi") is None
+    assert agent.select_model("Hi", model="smart") is None
+
+
+def test_select_model_routing(routed_agent):
+    """Test short opening messages go fast and the rest go smart."""
+    history = [{"role": "user", "content": "Hi"}]
+    
+    assert routed_agent.select_model("Hi") == "fast"
+    assert routed_agent.select_model("x" * settings.model_routing_max_chars) == "smart"
+    assert routed_agent.select_model("Hi", history) == "smart"
+    assert routed_agent.select_model("Hi", model="smart") == "smart"
+    assert routed_agent.select_model("Hi", model="unknown") == "fast"
+
+
+@pytest.mark.asyncio
+async def test_arun_uses_selected_model(routed_agent):
+    """Test the selected tier's model is sent to OpenAI."""
+    routed_agent.responses = [
+        [{"role": "assistant", "content": "Hi"}],
+        [{"role": "assistant", "content": "Hi"}]
+    ]
+    
+    await routed_agent.arun("Hello")
+    await routed_agent.arun("Hello", [{"role": "user", "content": "Hi"}])
+    
+    assert [call["model"] for call in routed_agent.calls] == ["gpt-fast", "gpt-smart"]
+
+
+def test_tool_usage_callback_handler():
+    """Test the handler records each started tool by name."""
+    handler = ToolUsageCallbackHandler()
+    
+    handler.on_tool_start({"name": "calculator"}, "2 + 3")
+    handler.on_tool_start({}, "")
+    
+    assert handler.tools_used == ["calculator", "unknown"]
+
+
+@pytest.mark.asyncio
+async def test_arun_reports_tools_used(agent):
+    """Test arun reports the tools the executor ran."""
+    agent.responses = [
+        [{"role": "assistant", **TOOL_CALL}],
+        [{"role": "assistant", "content": "The answer is 5"}]
+    ]
+    
+    result = await agent.arun("What is 2 + 3?")
+    
+    assert result == {"output": "The answer is 5", "tools_used": ["calculator"]}
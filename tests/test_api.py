@@ -2,9 +2,7 @@
 
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import patch, MagicMock
-import tempfile
-import os
+from unittest.mock import patch, MagicMock, AsyncMock
 
 from src.main import app
 from src.memory import ConversationMemory
@@ -19,16 +17,11 @@ def client():
 @pytest.fixture
 def mock_memory():
     """Create mock memory instance."""
-    with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as f:
-        db_path = f.name
-    
-    memory = ConversationMemory(db_path=db_path)
+    memory = ConversationMemory(db_path=":memory:")
     
     yield memory
     
-    # Cleanup
-    if os.path.exists(db_path):
-        os.unlink(db_path)
+    memory.close()
 
 
 def test_root_endpoint(client):
@@ -72,11 +65,11 @@ def test_chat_endpoint(client):
         # Mock agent execution
         with patch("src.main.get_agent") as mock_get_agent:
             mock_agent = MagicMock()
-            mock_agent.run.return_value = {
+            mock_agent.arun = AsyncMock(return_value={
                 "output": "Test response",
                 "tools_used": [],
                 "intermediate_steps": []
-            }
+            })
             mock_get_agent.return_value = mock_agent
             
             response = client.post(
@@ -99,3 +92,86 @@ def test_list_sessions(client):
         assert response.status_code == 200
         assert "sessions" in response.json()
         assert "total" in response.json()
+
+
+def test_chat_persists_messages(client, mock_memory):
+    """Test chat endpoint saves both messages after responding."""
+    with patch("src.main.verify_api_key", return_value=True), \
+            patch("src.main.memory", mock_memory):
+        with patch("src.main.get_agent") as mock_get_agent:
+            mock_agent = MagicMock()
+            mock_agent.arun = AsyncMock(return_value={
+                "output": "Test response",
+                "tools_used": ["calculator"],
+                "intermediate_steps": []
+            })
+            mock_get_agent.return_value = mock_agent
+            
+            response = client.post(
+                "/chat",
+                json={
+                    "message": "Hello",
+                    "session_id": "test-session-456"
+                }
+            )
+            
+            assert response.status_code == 200
+            messages = mock_memory.get_messages("test-session-456")
+            assert [m["role"] for m in messages] == ["user", "assistant"]
+            assert messages[1]["content"] == "Test response"
+
+
+def test_chat_endpoint_passes_overrides(client):
+    """Test chat endpoint forwards per-request LLM overrides to the agent."""
+    with patch("src.main.verify_api_key", return_value=True):
+        with patch("src.main.get_agent") as mock_get_agent:
+            mock_agent = MagicMock()
+            mock_agent.arun = AsyncMock(return_value={
+                "output": "Test response",
+                "tools_used": [],
+                "intermediate_steps": []
+            })
+            mock_get_agent.return_value = mock_agent
+            
+            response = client.post(
+                "/chat",
+                json={
+                    "message": "Hello",
+                    "session_id": "test-session-123",
+                    "temperature": 0.2,
+                    "max_tokens": 50
+                }
+            )
+            
+            assert response.status_code == 200
+            mock_get_agent.assert_called_once_with()
+            kwargs = mock_agent.arun.call_args.kwargs
+            assert kwargs["temperature"] == 0.2
+            assert kwargs["max_tokens"] == 50
+
+
+def test_chat_stream_endpoint(client, mock_memory):
+    """Test streaming endpoint emits SSE frames and saves the response."""
+    async def fake_astream(**kwargs):
+        for chunk in ["Hel", "lo"]:
+            yield chunk
+    
+    with patch("src.main.verify_api_key", return_value=True), \
+            patch("src.main.memory", mock_memory):
+        with patch("src.main.get_agent") as mock_get_agent:
+            mock_agent = MagicMock()
+            mock_agent.astream = fake_astream
+            mock_get_agent.return_value = mock_agent
+            
+            response = client.post(
+                "/chat/stream",
+                json={
+                    "message": "Hi",
+                    "session_id": "test-session-789"
+                }
+            )
+            
+            assert response.status_code == 200
+            assert response.text == "data: Hel\n\ndata: lo\n\ndata: [DONE]\n\n"
+            messages = mock_memory.get_messages("test-session-789")
+            assert messages[-1]["content"] == "Hello"
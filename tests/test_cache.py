@@ -0,0 +1,68 @@
+"""Unit tests for semantic cache module."""
+
+import pytest
+from unittest.mock import patch
+
+from src.cache import SemanticCache
+
+
+class FakeEmbeddings:
+    """Embeddings stub mapping known texts to fixed vectors."""
+    
+    vectors = {
+        "weather in NYC": [1.0, 0.0, 0.0],
+        "what's NY weather": [0.99, 0.1, 0.0],
+        "tell me a joke": [0.0, 1.0, 0.0],
+    }
+    
+    async def aembed_query(self, text):
+        return self.vectors[text]
+
+
+@pytest.fixture
+def cache():
+    """Create a semantic cache with fake embeddings."""
+    return SemanticCache(
+        embeddings=FakeEmbeddings(),
+        threshold=0.95,
+        max_entries=2,
+        ttl=3600,
+        tool_ttls={"weather": 600}
+    )
+
+
+@pytest.mark.asyncio
+async def test_lookup_hit_and_miss(cache):
+    """Test near-duplicate queries hit and unrelated queries miss."""
+    cache.add(await cache.aembed("weather in NYC"), "Sunny", ["weather"])
+    
+    hit = cache.lookup(await cache.aembed("what's NY weather"))
+    assert hit == {"output": "Sunny", "tools_used": ["weather"]}
+    
+    assert cache.lookup(await cache.aembed("tell me a joke")) is None
+
+
+@pytest.mark.asyncio
+async def test_tool_ttl_expiry(cache):
+    """Test entries expire after the shortest TTL of the tools used."""
+    embedding = await cache.aembed("weather in NYC")
+    
+    with patch("src.cache.time.monotonic", return_value=0.0):
+        cache.add(embedding, "Sunny", ["weather"])
+    
+    with patch("src.cache.time.monotonic", return_value=599.0):
+        assert cache.lookup(embedding) is not None
+    
+    with patch("src.cache.time.monotonic", return_value=601.0):
+        assert cache.lookup(embedding) is None
+
+
+@pytest.mark.asyncio
+async def test_eviction(cache):
+    """Test the oldest entry is evicted once the cache is full."""
+    cache.add(await cache.aembed("weather in NYC"), "Sunny", [])
+    cache.add(await cache.aembed("tell me a joke"), "Joke", [])
+    cache.add(await cache.aembed("tell me a joke"), "Another joke", [])
+    
+    assert cache.lookup(await cache.aembed("weather in NYC")) is None
+    assert cache.lookup(await cache.aembed("tell me a joke")) is not None
@@ -1,6 +1,8 @@
 """Unit tests for memory module."""
 
 import pytest
+import sqlite3
+from datetime import datetime
 import tempfile
 import os
 from pathlib import Path
@@ -22,9 +24,13 @@ def temp_db():
 
 
 @pytest.fixture
-def memory_instance(temp_db):
-    """Create a memory instance with temporary database."""
-    return ConversationMemory(db_path=temp_db)
+def memory_instance():
+    """Create a memory instance with an in-memory database."""
+    memory = ConversationMemory(db_path=":memory:")
+    
+    yield memory
+    
+    memory.close()
 
 
 def test_create_session(memory_instance):
@@ -77,6 +83,9 @@ def test_get_messages(memory_instance):
     # Get limited messages
     messages = memory_instance.get_messages(session_id, limit=3)
     assert len(messages) == 3
+    
+    # Limited messages are the most recent, in chronological order
+    assert [m["content"] for m in messages] == ["Message 2", "Message 3", "Message 4"]
 
 
 def test_get_session_info(memory_instance):
@@ -92,6 +101,10 @@ def test_get_session_info(memory_instance):
     assert info["session_id"] == session_id
     assert info["message_count"] == 1
     assert info["metadata"] == metadata
+    
+    # Stored as ISO-8601 so the API can pass it to Pydantic unchanged
+    assert datetime.fromisoformat(info["created_at"])
+    assert "T" in info["created_at"]
 
 
 def test_list_sessions(memory_instance):
@@ -124,3 +137,88 @@ def test_delete_session(memory_instance):
     # Try to delete non-existent session
     result = memory_instance.delete_session("non-existent")
     assert result is False
+
+
+def test_add_messages(memory_instance):
+    """Test adding several messages in one call."""
+    session_id = "test-session-1"
+    
+    memory_instance.add_messages(session_id, [
+        {"role": "user", "content": "Hello"},
+        {"role": "assistant", "content": "Hi there!", "metadata": {"tools_used": []}}
+    ])
+    
+    messages = memory_instance.get_messages(session_id)
+    assert [m["role"] for m in messages] == ["user", "assistant"]
+    assert memory_instance.get_session_info(session_id)["message_count"] == 2
+
+
+def test_clear_old_sessions(memory_instance):
+    """Test clearing sessions inactive for longer than the cutoff."""
+    memory_instance.create_session("recent")
+    memory_instance.create_session("stale")
+    memory_instance._conn().execute("""
+        UPDATE sessions SET updated_at = datetime('now', '-40 days')
+        WHERE session_id = 'stale'
+    """)
+    
+    assert memory_instance.clear_old_sessions(days=30) == 1
+    assert [s["session_id"] for s in memory_instance.list_sessions()] == ["recent"]
+
+
+@pytest.mark.asyncio
+async def test_async_methods(memory_instance):
+    """Test async wrappers around the memory methods."""
+    session_id = "test-session-1"
+    
+    assert await memory_instance.acreate_session(session_id) is True
+    await memory_instance.aadd_messages(session_id, [
+        {"role": "user", "content": "Hello"},
+        {"role": "assistant", "content": "Hi there!"}
+    ])
+    
+    messages = await memory_instance.aget_messages(session_id)
+    assert len(messages) == 2
+    info = await memory_instance.aget_session_info(session_id)
+    assert info["message_count"] == 2
+
+
+def test_message_count_migration(temp_db):
+    """Test databases from older versions are migrated and still readable."""
+    conn = sqlite3.connect(temp_db)
+    conn.executescript("""
+        CREATE TABLE sessions (
+            session_id TEXT PRIMARY KEY,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            metadata TEXT DEFAULT '{}'
+        );
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            metadata TEXT DEFAULT '{}'
+        );
+        INSERT INTO sessions (session_id, metadata) VALUES ('legacy', '{"source": "json"}');
+        INSERT INTO messages (session_id, role, content) VALUES ('legacy', 'user', 'Hello');
+    """)
+    conn.close()
+    
+    memory_instance = ConversationMemory(db_path=temp_db)
+    info = memory_instance.get_session_info("legacy")
+    assert info["message_count"] == 1
+    assert info["metadata"] == {"source": "json"}
+    
+    memory_instance.add_message("legacy", "assistant", "Hi there!")
+    assert memory_instance.get_session_info("legacy")["message_count"] == 2
+
+
+def test_dump_to_disk(memory_instance, temp_db):
+    """Test an in-memory database can be saved to a file."""
+    memory_instance.add_message("test-session-1", "user", "Hello")
+    memory_instance.dump_to_disk(temp_db)
+    
+    on_disk = ConversationMemory(db_path=temp_db)
+    assert [m["content"] for m in on_disk.get_messages("test-session-1")] == ["Hello"]
@@ -1,7 +1,12 @@
 """Unit tests for tools module."""
 
 import pytest
-from src.tools import CalculatorTool, WebSearchTool, WeatherTool, get_available_tools
+from unittest.mock import patch, AsyncMock, MagicMock
+from src.cache import TTLCache
+from src.tools import (
+    CachedTool, CalculatorTool, WebSearchTool, WeatherTool,
+    close_http_clients, get_async_http_client, get_available_tools
+)
 
 
 def test_calculator_tool():
@@ -19,6 +24,28 @@ def test_calculator_tool():
     # Test division
     result = tool._run("10 / 2")
     assert result == "5.0"
+    
+    # Test functions and operator precedence
+    assert tool._run("sqrt(16)") == "4.0"
+    assert tool._run("max(1, 5, 3) - 2 ** 3") == "-3"
+    assert tool._run("sum([1, 2, 3])") == "6"
+    assert tool._run("1,234 * 5") == "6170"
+    assert tool._run("1_000 + 5") == "1005"
+
+
+def test_calculator_tool_rejects_code():
+    """Test calculator refuses anything but arithmetic."""
+    tool = CalculatorTool()
+    
+    assert tool._run("__import__('os').getcwd()").startswith("Error calculating")
+    assert tool._run("9 ** 9 ** 9").startswith("Error calculating")
+    assert tool._run("pow(9, 10 ** 8)").startswith("Error calculating")
+    assert tool._run("(9 ** 9999) ** 9999").startswith("Error calculating")
+    assert tool._run("round(5, -10 ** 8)").startswith("Error calculating")
+    assert tool._run("[0] * 10 ** 9").startswith("Error calculating")
+    assert tool._run("1 / 0").startswith("Error calculating")
+    assert tool._run("1, 2").startswith("Error calculating")
+    assert tool._run("min([1], [2])").startswith("Error calculating")
 
 
 def test_web_search_tool():
@@ -35,6 +62,37 @@ def test_web_search_tool():
         pytest.skip("Network unavailable for web search test")
 
 
+@pytest.mark.asyncio
+async def test_web_search_tool_async():
+    """Test async web search uses the shared async HTTP client."""
+    tool = WebSearchTool()
+    response = MagicMock()
+    response.json.return_value = {"AbstractText": "A programming language."}
+    
+    client = MagicMock()
+    client.get = AsyncMock(return_value=response)
+    
+    with patch("src.tools.get_async_http_client", return_value=client):
+        result = await tool._arun("Python programming")
+    
+    assert result == "Summary: A programming language."
+    client.get.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_close_http_clients_resets_client():
+    """Test closing the async HTTP client lets the next call create a fresh one."""
+    client = get_async_http_client()
+    assert get_async_http_client() is client
+    
+    await close_http_clients()
+    
+    assert client.is_closed
+    new_client = get_async_http_client()
+    assert new_client is not client
+    await close_http_clients()
+
+
 def test_weather_tool():
     """Test weather tool."""
     tool = WeatherTool()
@@ -54,3 +112,40 @@ def test_get_available_tools():
     # Check tool names
     tool_names = [tool.name for tool in tools]
     assert "calculator" in tool_names or "web_search" in tool_names or "weather" in tool_names
+
+
+def test_cached_tool():
+    """Test cached tool reuses results for identical arguments."""
+    cached = CachedTool(CalculatorTool(), TTLCache(max_entries=10))
+    
+    with patch.object(CalculatorTool, "_run", return_value="391") as mock_run:
+        assert cached.run({"expression": "17*23"}) == "391"
+        assert cached.run({"expression": "17*23"}) == "391"
+        assert cached.run({"expression": "17*24"}) == "391"
+    
+    assert cached.name == "calculator"
+    assert mock_run.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_tool_skips_errors():
+    """Test cached tool does not cache error results."""
+    cached = CachedTool(WebSearchTool(), TTLCache(max_entries=10, ttl=60))
+    
+    with patch.object(WebSearchTool, "_arun", return_value="Error searching web") as mock_arun:
+        await cached.arun({"query": "Python"})
+        await cached.arun({"query": "Python"})
+    
+    assert mock_arun.call_count == 2
+
+
+def test_get_available_tools_is_cached():
+    """Test the tool list is shared until a tool setting changes."""
+    assert get_available_tools() is get_available_tools()
+    
+    with patch("src.tools.settings.enable_weather", False):
+        tools = get_available_tools()
+        assert "weather" not in [tool.name for tool in tools]
+        assert tools is get_available_tools()
+    
+    assert "weather" in [tool.name for tool in get_available_tools()]